@@ -1,34 +1,48 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+
 import gdown
 
 # Google Drive folder URL or ID
 google_drive_folder_url = "https://drive.google.com/drive/u/0/folders/1QvS1zRWWZdFCGUxXhBJeBbIovAIxfUn1"
+google_drive_folder_id = "1QvS1zRWWZdFCGUxXhBJeBbIovAIxfUn1"
 model_name = "dinov3-vitl16-pretrain-lvd1689m"
 local_dir = f"./model/"
+max_workers = 8
 
 # Create models directory if it doesn't exist
 os.makedirs(local_dir, exist_ok=True)
 
+
+def download_file(file):
+    os.makedirs(os.path.dirname(file.local_path) or ".", exist_ok=True)
+    # resume=True continues partial downloads instead of starting over
+    return gdown.download(id=file.id, output=file.local_path, quiet=True, use_cookies=True, resume=True)
+
+
+def download_folder_parallel(**folder_kwargs):
+    # List the folder first (no download), then fetch files concurrently;
+    # Drive throttles per file but serves several files in parallel.
+    files = gdown.download_folder(output=local_dir, quiet=True, use_cookies=True, skip_download=True, **folder_kwargs)
+    if not files:
+        raise RuntimeError("No files found in Google Drive folder")
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for path in pool.map(download_file, files):
+            if path is None:
+                raise RuntimeError("Failed to download a file from Google Drive")
+            print(f"Downloaded {path}")
+
+
 print(f"Downloading model from Google Drive to '{local_dir}'...")
 
 # Download the entire folder from Google Drive using URL format
 # This is more reliable than using just the ID
 try:
-    gdown.download_folder(
-        url=google_drive_folder_url,
-        output=local_dir,
-        quiet=False,
-        use_cookies=True  # Use cookies for better compatibility
-    )
+    download_folder_parallel(url=google_drive_folder_url)
     print(f"Model downloaded successfully to '{local_dir}'")
 except Exception as e:
     print(f"Error downloading with URL method: {e}")
     print("Trying alternative method with folder ID...")
     # Fallback: try with folder ID
-    gdown.download_folder(
-        id="1QvS1zRWWZdFCGUxXhBJeBbIovAIxfUn1",
-        output=local_dir,
-        quiet=False,
-        use_cookies=True
-    )
-    print(f"Model downloaded successfully to '{local_dir}'")
\ No newline at end of file
+    download_folder_parallel(id=google_drive_folder_id)
+    print(f"Model downloaded successfully to '{local_dir}'")
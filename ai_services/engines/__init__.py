@@ -1,10 +1,13 @@
 from .vectordb import VectorDB
+from .coalescer import UpsertCoalescer, SearchCoalescer
 from .image_embedder import ImageEmbedder
 from .llm import LLMEngine
 from .prompt import ANALYSIS_PROMPT, SUMMARY_PROMPT, TEXT2QUERY_PROMPT
 
 __all__ = [
     "VectorDB",
+    "UpsertCoalescer",
+    "SearchCoalescer",
     "ImageEmbedder",
     "LLMEngine",
     "ANALYSIS_PROMPT",
@@ -0,0 +1,139 @@
+import abc
+import asyncio
+from typing import Any, List, Optional, Set, Tuple
+
+from logger import file_logger as logger
+
+
+class MicroBatcher(abc.ABC):
+    """Coalesces concurrent requests into batches.
+
+    Callers submit an item and await its future; a background task drains the queue in batches
+    of up to `max_batch` items, waiting at most `max_delay_ms` after the first one, and resolves
+    each future with its own result. Up to `max_inflight` batches are processed concurrently.
+    """
+
+    def __init__(self, max_batch: int, max_delay_ms: float, max_inflight: int = 1):
+        self.max_batch = max(1, int(max_batch))
+        self.max_delay_ms = float(max_delay_ms)
+        self.max_inflight = max(1, int(max_inflight))
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Semaphore] = None
+        self._jobs: Set[asyncio.Task] = set()
+        # items already taken off the queue by an unfinished _drain(); failed with the queue on shutdown
+        self._draining: List[Tuple[Any, asyncio.Future]] = []
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._inflight = asyncio.Semaphore(self.max_inflight)
+            self._jobs = set()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(
+                "%s started (max_batch=%s, max_delay_ms=%s, max_inflight=%s).",
+                type(self).__name__, self.max_batch, self.max_delay_ms, self.max_inflight,
+            )
+
+    def cancel(self):
+        """Stop draining without waiting; in-flight batches are cancelled and queued items failed."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._task = None
+        for job in list(self._jobs):
+            job.cancel()
+        self._fail_queued()
+
+    async def stop(self):
+        """Stop draining, let in-flight batches finish, and fail whatever is still queued."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._jobs:
+            await asyncio.gather(*self._jobs, return_exceptions=True)
+        self._fail_queued()
+        logger.info("%s stopped.", type(self).__name__)
+
+    def _fail_queued(self):
+        pending, self._draining = self._draining, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, fut in pending:
+            if not fut.done():
+                fut.set_exception(RuntimeError(f"{type(self).__name__} stopped"))
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its result."""
+        self.start()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, fut))
+        return await fut
+
+    async def _drain(self) -> List[Tuple[Any, asyncio.Future]]:
+        """Block for the first pending item, then gather more until the cap or the time window closes."""
+        batch = self._draining = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay_ms / 1000.0
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # take a slot first, so items keep queueing (and batches grow) while all slots are busy
+            await self._inflight.acquire()
+            try:
+                batch = await self._drain()
+            except BaseException:
+                self._inflight.release()
+                raise
+            self._draining = []
+            job = loop.create_task(self._run_batch(batch))
+            self._jobs.add(job)
+            job.add_done_callback(self._jobs.discard)
+
+    async def _run_batch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        futures = [fut for _, fut in batch]
+        try:
+            results = await self._process([item for item, _ in batch])
+        except asyncio.CancelledError:
+            for fut in futures:
+                if not fut.done():
+                    fut.set_exception(RuntimeError(f"{type(self).__name__} stopped"))
+            raise
+        except Exception as e:
+            for fut in futures:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        finally:
+            self._inflight.release()
+        for fut, result in zip(futures, results):
+            if fut.done():
+                continue
+            if isinstance(result, BaseException):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
+
+    @abc.abstractmethod
+    async def _process(self, items: List[Any]) -> List[Any]:
+        """Return one result per item, in order; an exception instance fails only that item."""
@@ -0,0 +1,108 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from logger import file_logger as logger
+from .batcher import MicroBatcher
+from .vectordb import VectorDB
+
+
+class UpsertCoalescer(MicroBatcher):
+    """Batches single-vector upserts into one `VectorDB.upsert_vectors` RPC.
+
+    Flushes only every `flush_every` batches (and on stop); Milvus serves unflushed rows from
+    growing segments, so flush only matters for durability.
+    """
+
+    def __init__(self, vdb: VectorDB, max_batch: int = 256, max_delay_ms: float = 50.0, flush_every: int = 10):
+        super().__init__(max_batch=max_batch, max_delay_ms=max_delay_ms)
+        self.vdb = vdb
+        self.flush_every = max(1, int(flush_every))
+        self._batches = 0
+
+    async def upsert(self, id: str, vector: Union[Sequence[float], np.ndarray], metadata: Optional[Dict[str, Any]] = None):
+        """Queue one upsert and wait for the batch carrying it. Invalid rows fail here, not the batch."""
+        self.vdb.validate_id(id)
+        metadata = self.vdb.validate_metadata(metadata)
+        vec = self.vdb.validate_vector(vector)
+        return await self.submit((id, vec, metadata))
+
+    async def _process(self, items: List[Tuple[str, np.ndarray, Optional[Dict[str, Any]]]]) -> List[Any]:
+        # last write wins for an id queued twice in the same batch
+        latest = {}
+        for id, vec, metadata in items:
+            latest[id] = (vec, metadata)
+        ids = list(latest)
+        vectors = np.stack([latest[i][0] for i in ids])
+        metadatas = [latest[i][1] for i in ids]
+
+        try:
+            result = await self.vdb.upsert_vectors(ids, vectors, metadatas)
+            by_id = dict.fromkeys(ids, result)
+        except Exception:
+            if len(ids) == 1:
+                raise
+            # something the client-side checks missed: retry row by row so only the bad row fails
+            logger.warning("Batched upsert of %s rows failed, retrying rows one by one.", len(ids))
+            results = await asyncio.gather(
+                *(self.vdb.upsert_vectors([i], vectors[k:k + 1], metadatas[k:k + 1]) for k, i in enumerate(ids)),
+                return_exceptions=True,
+            )
+            by_id = dict(zip(ids, results))
+
+        self._batches += 1
+        if self._batches % self.flush_every == 0:
+            await self._flush()
+        return [by_id[id] for id, _, _ in items]
+
+    async def _flush(self):
+        try:
+            await self.vdb.flush()
+        except Exception:
+            # rows are already written; a failed flush only delays sealing
+            pass
+
+    async def stop(self):
+        await super().stop()
+        await self._flush()
+
+
+class SearchCoalescer(MicroBatcher):
+    """Merges concurrent single-vector searches into multi-vector `retrieve_similar` calls.
+
+    Queries sharing a `top_k` go out as one 2-D search; a query with a unique `top_k`
+    takes the plain single-vector path.
+    """
+
+    def __init__(self, vdb: VectorDB, max_batch: int = 32, max_delay_ms: float = 5.0):
+        super().__init__(max_batch=max_batch, max_delay_ms=max_delay_ms)
+        self.vdb = vdb
+
+    async def search(self, vector: Union[Sequence[float], np.ndarray], top_k: int = 5):
+        """Queue one search and wait for its hits (same format as `VectorDB.retrieve_similar`)."""
+        vec = np.asarray(vector, dtype=np.float32)
+        if vec.ndim != 1 or vec.shape[0] != self.vdb.dim:
+            raise ValueError(f"Vector must be 1-D with dim={self.vdb.dim}")
+        return await self.submit((vec, int(top_k)))
+
+    async def _process(self, items: List[Tuple[np.ndarray, int]]) -> List[Any]:
+        groups: Dict[int, List[int]] = {}
+        for i, (_, top_k) in enumerate(items):
+            groups.setdefault(top_k, []).append(i)
+
+        async def run_group(top_k: int, idxs: List[int]):
+            if len(idxs) == 1:
+                return [await self.vdb.retrieve_similar(query_vector=items[idxs[0]][0], top_k=top_k)]
+            queries = np.stack([items[i][0] for i in idxs])
+            return await self.vdb.retrieve_similar(query_vector=queries, top_k=top_k)
+
+        group_results = await asyncio.gather(
+            *(run_group(top_k, idxs) for top_k, idxs in groups.items()), return_exceptions=True
+        )
+
+        results: List[Any] = [None] * len(items)
+        for idxs, res in zip(groups.values(), group_results):
+            for k, i in enumerate(idxs):
+                results[i] = res if isinstance(res, BaseException) else res[k]
+        return results
@@ -1,17 +1,39 @@
-from typing import Union, Optional
+from typing import IO, Union, Optional, List, Tuple, Literal
 import io
+import os
 import asyncio
+import contextlib
+import queue
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from PIL import Image
 import torch
+import torch.nn.functional as F
+from torchvision.transforms import v2
 from transformers import AutoImageProcessor, AutoModel
 from transformers.image_utils import load_image
+from turbojpeg import TurboJPEG, TJPF_RGB
 
 from logger import file_logger as logger
+from .batcher import MicroBatcher
 
-ImageInput = Union[str, bytes, Image.Image]
+ImageInput = Union[str, bytes, IO[bytes], Image.Image, torch.Tensor, np.ndarray]
+DecodedImage = Union[Image.Image, np.ndarray]
+_JPEG_MAGIC = b"\xff\xd8\xff"
+QuantMode = Literal["none", "int8_weight", "int8_dynamic", "fp8"]
+
+
+class _EmbedBatcher(MicroBatcher):
+    """Coalesces decoded images from concurrent embed() calls into batched forward passes."""
+
+    def __init__(self, embedder: "ImageEmbedder", max_batch: int, max_delay_ms: float, max_inflight: int):
+        super().__init__(max_batch=max_batch, max_delay_ms=max_delay_ms, max_inflight=max_inflight)
+        self.embedder = embedder
+
+    async def _process(self, items: List[DecodedImage]) -> List[np.ndarray]:
+        return list(await self.embedder._run_forward(self.embedder._infer_blocking, items))
 
 
 class ImageEmbedder:
@@ -21,11 +43,33 @@ class ImageEmbedder:
         device: Optional[str] = None, #"cuda:0", "cpu"
         device_map: Optional[Union[str, dict]] = None,
         torch_dtype: Optional[torch.dtype] = None,
+        max_batch_size: int = 16,
+        max_batch_wait_ms: float = 5.0,
+        compile: bool = True,
+        image_size: Tuple[int, int] = (224, 224),
+        quant: QuantMode = "int8_weight",
+        autocast_dtype: Optional[torch.dtype] = None,
+        num_streams: int = 4,
     ):
+        """
+        `quant` (default int8 weight-only) only applies to CUDA models loaded without `torch_dtype`.
+        Quantized embeddings differ slightly from full-precision ones: collections filled with a
+        different `quant` setting should be re-indexed before mixing the two.
+        """
         self.model_id = model_name_or_path
         self.device = torch.device(device) if device else None
         self.device_map = device_map
         self.torch_dtype = torch_dtype
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_batch_wait_ms = float(max_batch_wait_ms)
+
+        # shared decode pool + libjpeg-turbo (SIMD) for JPEG inputs; PIL handles everything else
+        self._decode_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="decode")
+        try:
+            self._tj = TurboJPEG()
+        except Exception:
+            self._tj = None
+            logger.warning("libjpeg-turbo not available, falling back to PIL for JPEG decoding.")
 
         self.processor = AutoImageProcessor.from_pretrained(self.model_id)
 
@@ -39,42 +83,210 @@ class ImageEmbedder:
         if self.device:
             self.model.to(self.device)
         self.model.eval()
+        self._primary_device = self._resolve_primary_device()
+        self._input_buffer: Optional[torch.Tensor] = None
+
+        on_cuda = self._primary_device is not None and self._primary_device.type == "cuda"
+
+        # mixed precision on CUDA: bf16 where supported, else fp16 (tensor cores on both)
+        self._use_autocast = on_cuda
+        if autocast_dtype is None and self._use_autocast:
+            autocast_dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+        self.autocast_dtype = autocast_dtype
+
+        self.quant = quant
+        if self.quant != "none" and self.torch_dtype is None and on_cuda:
+            self._quantize(self.quant)
+
+        # torch.compile + CUDA graphs need static input shapes: fix the preprocessing output
+        # size and pad batches up to a small set of bucket sizes.
+        self._compiled = bool(compile) and on_cuda
+        self._transform = self._build_transform(image_size if self._compiled else None)
+        self._to_image = v2.ToImage()
+        self._batch_buckets = [self.max_batch_size]
+        if self._compiled:
+            self._batch_buckets = sorted(
+                {min(2 ** i, self.max_batch_size) for i in range(self.max_batch_size.bit_length() + 1)}
+            )
+            self.model = torch.compile(self.model, mode="reduce-overhead", dynamic=False)
+            logger.info("Image embedding model compiled with torch.compile (reduce-overhead).")
+
+        # CUDA-graph trees keep per-thread state: warmup and every compiled forward must run on
+        # the same thread, which also serializes them over the shared input buffer.
+        self._forward_executor: Optional[ThreadPoolExecutor] = None
+        if self._compiled:
+            self._forward_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compiled-forward")
+
+        # Eager CUDA: each in-flight batch borrows its own stream so H2D copies and kernels of
+        # independent batches overlap.
+        self._stream_pool: Optional[queue.SimpleQueue] = None
+        self.num_streams = 1
+        if on_cuda and not self._compiled and num_streams > 1:
+            self.num_streams = int(num_streams)
+            self._stream_pool = queue.SimpleQueue()
+            for _ in range(self.num_streams):
+                self._stream_pool.put(torch.cuda.Stream(device=self._primary_device))
+
+        # micro-batching: embed() submits decoded images, a background worker runs batched
+        # forwards, up to num_streams batches in flight (one per CUDA stream)
+        self._batcher = _EmbedBatcher(
+            self, max_batch=self.max_batch_size, max_delay_ms=self.max_batch_wait_ms, max_inflight=self.num_streams
+        )
         logger.info("Image embedding model loaded")
 
-    def _load_image(self, inp: ImageInput) -> Image.Image:
-        """Load image from URL/path/bytes/PIL -> PIL.Image (RGB)."""
+    def _resolve_primary_device(self) -> Optional[torch.device]:
+        """Device of the first parameter; inputs are sent there (sharded models take inputs on it too)."""
+        try:
+            return next(self.model.parameters()).device
+        except Exception:
+            logger.debug("Could not resolve model device. Inputs will stay on CPU.")
+            return None
+
+    def _build_transform(self, fixed_size: Optional[Tuple[int, int]] = None) -> v2.Compose:
+        """Tensor-only equivalent of the HF processor (resize, crop, rescale, normalize).
+
+        Sizes and mean/std come from the processor config; `fixed_size` forces a static (H, W).
+        The output (H, W) is always fixed so images of any aspect ratio can share a batch.
+        """
+        proc = self.processor
+        mean = list(getattr(proc, "image_mean", None) or (0.485, 0.456, 0.406))
+        std = list(getattr(proc, "image_std", None) or (0.229, 0.224, 0.225))
+        # PIL resample code (e.g. 2 = bilinear, 3 = bicubic), accepted by torchvision as-is
+        interpolation = v2.InterpolationMode.BILINEAR
+        if getattr(proc, "resample", None) is not None:
+            interpolation = int(proc.resample)
+
+        steps = []
+        if fixed_size is not None:
+            steps.append(v2.Resize(tuple(fixed_size), interpolation=interpolation, antialias=True))
+        else:
+            size = getattr(proc, "size", None) or {"height": 224, "width": 224}
+            if not isinstance(size, dict):
+                size = {"shortest_edge": int(size)}
+            crop = getattr(proc, "crop_size", None)
+            do_crop = bool(getattr(proc, "do_center_crop", False) and crop)
+            if "height" in size and "width" in size:
+                steps.append(v2.Resize((size["height"], size["width"]), interpolation=interpolation, antialias=True))
+            else:
+                edge = size.get("shortest_edge") or next(iter(size.values()))
+                steps.append(v2.Resize(edge, interpolation=interpolation, antialias=True))
+                if not do_crop:
+                    # batched images must share one (H, W): square-crop when the processor has no crop
+                    steps.append(v2.CenterCrop((edge, edge)))
+            if do_crop:
+                steps.append(v2.CenterCrop((crop["height"], crop["width"])))
+        steps += [
+            v2.ToDtype(torch.float32, scale=True),
+            v2.Normalize(mean=mean, std=std),
+        ]
+        return v2.Compose(steps)
+
+    def _quantize(self, quant: QuantMode):
+        """Quantize linear layers in-place with torchao (GPU only)."""
+        from torchao.quantization.quant_api import (
+            quantize_,
+            Int8WeightOnlyConfig,
+            Int8DynamicActivationInt8WeightConfig,
+            Float8DynamicActivationFloat8WeightConfig,
+        )
+
+        if quant == "fp8" and torch.cuda.get_device_capability(self._primary_device) < (8, 9):
+            logger.warning("FP8 quantization needs compute capability >= 8.9, falling back to int8_dynamic.")
+            quant = "int8_dynamic"
+
+        configs = {
+            "int8_weight": Int8WeightOnlyConfig,
+            "int8_dynamic": Int8DynamicActivationInt8WeightConfig,
+            "fp8": Float8DynamicActivationFloat8WeightConfig,
+        }
+        if quant not in configs:
+            raise ValueError(f"Unsupported quant mode '{quant}'")
+        try:
+            quantize_(self.model, configs[quant]())
+            logger.info(f"Image embedding model quantized ({quant}).")
+        except Exception:
+            logger.error(f"Failed to quantize model ({quant}).")
+            raise
+
+    def _decode_jpeg(self, data: bytes) -> DecodedImage:
+        try:
+            return self._tj.decode(data, pixel_format=TJPF_RGB)
+        except Exception:
+            # e.g. CMYK/YCCK JPEGs, which libjpeg-turbo can't convert to RGB; PIL can
+            logger.debug("libjpeg-turbo decode failed, falling back to PIL.")
+            return Image.open(io.BytesIO(data)).convert("RGB")
+
+    def _load_file(self, f: IO[bytes]) -> DecodedImage:
+        # decode straight from the (spooled) upload file; only JPEGs for libjpeg-turbo are read into memory
+        if f.seekable():
+            f.seek(0)
+            if self._tj is not None:
+                head = f.read(len(_JPEG_MAGIC))
+                f.seek(0)
+                if head == _JPEG_MAGIC:
+                    return self._decode_jpeg(f.read())
+        return Image.open(f).convert("RGB")
+
+    def _load_image(self, inp: ImageInput) -> DecodedImage:
+        """Load image from URL/path/bytes/file/PIL -> PIL.Image (RGB), or an RGB HWC ndarray for JPEGs."""
         try:
             if isinstance(inp, Image.Image):
                 img = inp.convert("RGB")
+            elif isinstance(inp, np.ndarray):
+                if inp.ndim != 3 or inp.shape[2] != 3:
+                    raise ValueError("ndarray image must be RGB with shape (H, W, 3)")
+                # ToDtype(scale=True) only rescales integer input; float arrays would be mis-normalized
+                if inp.dtype != np.uint8:
+                    raise ValueError(f"ndarray image must be uint8 (0-255), got {inp.dtype}")
+                img = inp
             elif isinstance(inp, bytes):
-                img = Image.open(io.BytesIO(inp)).convert("RGB")
+                if self._tj is not None and inp.startswith(_JPEG_MAGIC):
+                    img = self._decode_jpeg(inp)
+                else:
+                    img = Image.open(io.BytesIO(inp)).convert("RGB")
+            elif hasattr(inp, "read"):
+                img = self._load_file(inp)
             elif isinstance(inp, str):
                 if inp.startswith("http://") or inp.startswith("https://"):
                     img = load_image(inp).convert("RGB")
+                elif self._tj is not None and inp.lower().endswith((".jpg", ".jpeg")):
+                    with open(inp, "rb") as f:
+                        img = self._decode_jpeg(f.read())
                 else:
                     img = Image.open(inp).convert("RGB")
             else:
-                raise TypeError("image must be URL string, local path, bytes, or PIL.Image.Image")
+                raise TypeError("image must be URL string, local path, bytes, binary file object, PIL.Image.Image, ndarray, or torch.Tensor")
             logger.debug("Image loaded successfully.")
             return img
         except Exception:
             logger.error("Failed to load image.")
             raise
 
-    def _prepare_inputs(self, pil_image: Image.Image):
+    def _prepare_inputs(self, pil_images: List[DecodedImage]):
+        """Decoded images -> {"pixel_values": (N, 3, H, W)} on the model device.
+
+        Images are sent to the GPU as uint8 (4x fewer bytes than float32) and resized/normalized there.
+        """
         try:
-            inputs = self.processor(images=pil_image, return_tensors="pt")
-            # try to move inputs to a device if model has a single device attribute
-            try:
-                first_param = next(self.model.parameters())
-                primary_device = first_param.device
-                inputs = {k: v.to(primary_device) for k, v in inputs.items()}
-                logger.debug(f"Inputs moved to device {primary_device}.")
-            except Exception:
-                logger.debug("Could not move inputs to model device (model may be sharded). Leaving on CPU.")
+            device = self._primary_device
+            on_gpu = device is not None and device.type == "cuda"
+            tensors = []
+            for img in pil_images:
+                t = self._to_image(img)
+                if on_gpu:
+                    # pinned host memory lets the H2D copy run asynchronously w.r.t. the host
+                    t = t.pin_memory().to(device, non_blocking=True)
+                tensors.append(self._transform(t))
+            pixel_values = torch.stack(tensors)
+            if device is not None and not on_gpu:
+                pixel_values = pixel_values.to(device)
+            inputs = {"pixel_values": pixel_values}
+            if self._compiled:
+                inputs = self._pad_to_bucket(inputs, len(pil_images))
+            logger.debug(f"Inputs prepared on device {pixel_values.device}.")
             return inputs
         except Exception:
-            logger.error("Failed to prepare inputs with processor.")
+            logger.error("Failed to prepare inputs.")
             raise
 
     def _postprocess_output(self, outputs: torch.nn.Module) -> np.ndarray:
@@ -85,40 +297,119 @@ class ImageEmbedder:
                 else:
                     vec = outputs.last_hidden_state[:, 0, :]
 
-            vec = vec.detach().cpu().numpy().reshape(-1).astype(np.float32)
-            norm = np.linalg.norm(vec)
-            if norm > 0:
-                vec = vec / norm
-            logger.debug("Postprocessing complete (pooled embedding extracted and normalized).")
+                # normalize on-device; a single D2H copy of the already-normalized batch
+                vec = F.normalize(vec.reshape(vec.shape[0], -1).float(), p=2, dim=-1)
+            vec = vec.cpu().numpy()
+            logger.debug("Postprocessing complete (pooled embeddings extracted and normalized).")
             return vec
         except Exception:
             logger.error("Failed to postprocess model outputs.")
             raise
 
-    def _infer_blocking(self, pil_image: Image.Image) -> np.ndarray:
+    @contextlib.contextmanager
+    def _execution_scope(self):
+        """Borrow a CUDA stream from the pool (eager CUDA only)."""
+        if self._stream_pool is not None:
+            stream = self._stream_pool.get()
+            try:
+                with torch.cuda.stream(stream):
+                    yield
+                stream.synchronize()
+            finally:
+                self._stream_pool.put(stream)
+        else:
+            yield
+
+    def _infer_blocking(self, pil_images: List[DecodedImage]) -> np.ndarray:
+        """Run one forward pass over a batch of images. Returns (N, D) L2-normalized float32."""
         try:
-            inputs = self._prepare_inputs(pil_image)
+            n = len(pil_images)
             start = time.time()
-            with torch.inference_mode():
-                outputs = self.model(**inputs)
-            emb = self._postprocess_output(outputs)
+            with self._execution_scope():
+                inputs = self._prepare_inputs(pil_images)
+                emb = self._model_forward(inputs, n)
             elapsed = time.time() - start
-            logger.debug(f"Inference completed in {elapsed:.4f}s")
+            logger.debug(f"Inference completed in {elapsed:.4f}s (batch={len(pil_images)})")
             return emb
         except Exception:
             logger.error("Inference failed.")
             raise
 
+    def _model_forward(self, inputs, n: int) -> np.ndarray:
+        """Model forward + postprocess only, on already-prepared inputs. Returns the first n rows."""
+        with torch.inference_mode(), torch.autocast("cuda", dtype=self.autocast_dtype, enabled=self._use_autocast):
+            outputs = self.model(**inputs)
+        return self._postprocess_output(outputs)[:n]
+
+    def _infer_tensor_blocking(self, pixel_values: torch.Tensor) -> np.ndarray:
+        """Fast path for preprocessed (3, H, W) / (N, 3, H, W) pixel values: no decode, no resize/normalize."""
+        try:
+            if pixel_values.dim() not in (3, 4) or pixel_values.shape[-3] != 3:
+                raise ValueError("tensor input must have shape (3, H, W) or (N, 3, H, W)")
+            batched = pixel_values.dim() == 4
+            pv = pixel_values if batched else pixel_values.unsqueeze(0)
+            n = pv.shape[0]
+            with self._execution_scope():
+                if self._primary_device is not None:
+                    pv = pv.to(self._primary_device, non_blocking=True)
+                inputs = {"pixel_values": pv}
+                if self._compiled and n <= self.max_batch_size:
+                    inputs = self._pad_to_bucket(inputs, n)
+                emb = self._model_forward(inputs, n)
+            return emb if batched else emb[0]
+        except Exception:
+            logger.error("Tensor inference failed.")
+            raise
+
+    def _pad_to_bucket(self, inputs, n: int):
+        """Zero-pad the batch dim to the next bucket size so compiled graphs are reused.
+
+        pixel_values are written into a persistent (max_batch_size, C, H, W) buffer on their device.
+        """
+        bucket = next((b for b in self._batch_buckets if b >= n), n)
+        padded = {}
+        for k, v in inputs.items():
+            if k == "pixel_values" and bucket <= self.max_batch_size:
+                shape = (self.max_batch_size, *v.shape[1:])
+                buf = self._input_buffer
+                if buf is None or buf.shape != shape or buf.dtype != v.dtype or buf.device != v.device:
+                    pin = v.device.type == "cpu" and torch.cuda.is_available()
+                    buf = self._input_buffer = torch.empty(shape, dtype=v.dtype, device=v.device, pin_memory=pin)
+                buf = buf[:bucket]
+                buf[:n].copy_(v)
+                buf[n:].zero_()
+                padded[k] = buf
+            elif bucket > n:
+                padded[k] = torch.cat([v, v.new_zeros((bucket - n, *v.shape[1:]))], dim=0)
+            else:
+                padded[k] = v
+        return padded
+
+    async def _run_forward(self, fn, *args):
+        """Run a blocking forward off the event loop: on the compiled-forward thread, else a default worker."""
+        if self._forward_executor is not None:
+            return await asyncio.get_running_loop().run_in_executor(self._forward_executor, fn, *args)
+        return await asyncio.to_thread(fn, *args)
+
     async def embed(self, image: ImageInput) -> np.ndarray:
         """
         Async wrapper for producing a single embedding.
-        Accepts URL (http/https), local path, bytes, or PIL.Image.
-        Returns: 1-D L2-normalized np.ndarray (float32).
+        Accepts URL (http/https), local path, bytes, a binary file object, PIL.Image, or an RGB (H, W, 3) uint8 ndarray.
+        Concurrent calls are coalesced into batched forward passes by a background worker.
+        A torch.Tensor is taken as already-preprocessed pixel values, (3, H, W) or (N, 3, H, W),
+        and goes straight to the model.
+        Returns: 1-D L2-normalized np.ndarray (float32), or (N, D) for a 4-D tensor.
         """
         logger.info("Embed request received.")
         try:
-            pil = await asyncio.to_thread(self._load_image, image)
-            emb = await asyncio.to_thread(self._infer_blocking, pil)
+            if isinstance(image, torch.Tensor):
+                emb = await self._run_forward(self._infer_tensor_blocking, image)
+                logger.info("Embed request completed successfully.")
+                return emb
+
+            loop = asyncio.get_running_loop()
+            pil = await loop.run_in_executor(self._decode_pool, self._load_image, image)
+            emb = await self._batcher.submit(pil)
             logger.info("Embed request completed successfully.")
             return emb
         except Exception:
@@ -126,6 +417,12 @@ class ImageEmbedder:
             raise
 
     def warmup(self):
+        if self._forward_executor is not None:
+            # capture the CUDA graphs on the thread that will replay them
+            return self._forward_executor.submit(self._warmup_blocking).result()
+        return self._warmup_blocking()
+
+    def _warmup_blocking(self):
         try:
             size = None
             try:
@@ -139,7 +436,13 @@ class ImageEmbedder:
                 size = 224
 
             dummy = Image.new("RGB", (size, size), color=(127, 127, 127))
-            _ = self._infer_blocking(dummy)
+            if self._compiled:
+                # capture every bucket shape a few times so CUDA graphs are stable before serving
+                for bucket in self._batch_buckets:
+                    for _ in range(3):
+                        _ = self._infer_blocking([dummy] * bucket)
+            else:
+                _ = self._infer_blocking([dummy])
             logger.info("Warmup completed.")
             return True
         except Exception:
@@ -148,6 +451,10 @@ class ImageEmbedder:
 
     def close(self):
         logger.info("Closing ImageEmbedder and freeing resources...")
+        self._batcher.cancel()
+        self._decode_pool.shutdown(wait=False)
+        if self._forward_executor is not None:
+            self._forward_executor.shutdown(wait=False)
         try:
             if self.model is not None and hasattr(self.model, "cpu"):
                 try:
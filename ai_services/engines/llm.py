@@ -3,18 +3,44 @@ from langchain_core.prompts.chat import ChatPromptTemplate
 
 from langchain_core.output_parsers.json import JsonOutputParser
 from langchain_core.output_parsers.string import StrOutputParser
+from langchain_core.outputs import Generation
 import asyncio
 import os
+import re
 from schemas import Product
-from typing import Dict, Any
-import json
+from typing import Dict, Any, List
+import orjson
 from .prompt import SUMMARY_PROMPT, ANALYSIS_PROMPT, TEXT2CONSTRAINT_PROMPT
 
 from logger import file_logger as logger
 
+_MARKDOWN_FENCE = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*```\s*$", re.DOTALL)
+
+
+def _strip_markdown_fences(text: str) -> str:
+    match = _MARKDOWN_FENCE.match(text)
+    return match.group(1) if match else text.strip()
+
+
+class FastJsonOutputParser(JsonOutputParser):
+    """JsonOutputParser that parses complete responses with orjson.
+
+    Falls back to the stock (lenient) parser for partial/streamed output or anything orjson rejects.
+    """
+
+    def parse_result(self, result: List[Generation], *, partial: bool = False) -> Any:
+        if not partial:
+            try:
+                return orjson.loads(_strip_markdown_fences(result[0].text))
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse_result(result, partial=partial)
+
+
 class LLMEngine:
-    def __init__(self, openai_api_key: str, model: str = "gpt-4o-mini", temperature: float = 0):
+    def __init__(self, openai_api_key: str, model: str = "gpt-4o-mini", temperature: float = 0, max_concurrency: int = 8):
         """Initialize optimized LLM pipeline."""
+        self.max_concurrency = max_concurrency
         self.llm = ChatOpenAI(
             model_name=model,
             openai_api_key=openai_api_key,
@@ -27,9 +53,9 @@ class LLMEngine:
         self.text2constraint = ChatPromptTemplate.from_template(TEXT2CONSTRAINT_PROMPT)
 
         # Build LCEL-style chains
-        self.summarize_chain = self.summary_prompt | self.llm | JsonOutputParser()
-        self.analyze_chain = self.analysis_prompt | self.llm | JsonOutputParser()
-        self.text2constraint_chain = self.text2constraint | self.llm | JsonOutputParser()
+        self.summarize_chain = self.summary_prompt | self.llm | FastJsonOutputParser()
+        self.analyze_chain = self.analysis_prompt | self.llm | FastJsonOutputParser()
+        self.text2constraint_chain = self.text2constraint | self.llm | FastJsonOutputParser()
 
     async def analyze_product(self, product: Product) -> Dict[str, Any]:
         """Analyze all reviews for a given product asynchronously."""
@@ -50,6 +76,19 @@ class LLMEngine:
         except Exception as e:
             logger.error(f"Failed to analyze review because of {e}.")
 
+    async def analyze_products(self, products: List[Product]) -> List[Any]:
+        """Analyze several products concurrently, at most `max_concurrency` LLM calls in flight.
+
+        Results keep the input order; a failed analysis is returned as its exception.
+        """
+        sem = asyncio.Semaphore(self.max_concurrency)
+
+        async def one(product: Product):
+            async with sem:
+                return await self.analyze_product(product)
+
+        return await asyncio.gather(*(one(p) for p in products), return_exceptions=True)
+
     async def compare_products(self, analyzed_products: Dict[str, Dict[str, Any]]) -> str:
         """
         Compare multiple analyzed products (aspects + summaries)
@@ -58,7 +97,7 @@ class LLMEngine:
         try:
             product_summaries = "\n\n".join(
                 [
-                    f"{name}:\n{json.dumps([a.dict() for a in summary], indent=2)}"
+                    f"{name}:\n{orjson.dumps([a.model_dump() for a in summary], option=orjson.OPT_INDENT_2).decode()}"
                     for name, summary in analyzed_products.items()
                 ]
             )
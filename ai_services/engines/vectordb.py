@@ -1,14 +1,43 @@
 import asyncio
-from typing import Any, Dict, List, Optional, Sequence, Union
+import itertools
+import weakref
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
 from pymilvus import (
     connections,
     FieldSchema, CollectionSchema, DataType,
     Collection, utility
 )
 import numpy as np
+import orjson
+from pybloom_live import ScalableBloomFilter
+
+try:
+    from pymilvus import AsyncMilvusClient
+except ImportError:  # pymilvus < 2.5: every RPC goes through asyncio.to_thread
+    AsyncMilvusClient = None
 
 from logger import file_logger as logger
 
+# single-pass escape table for ids embedded in quoted filter expressions
+_ID_ESCAPE = str.maketrans({"\\": "\\\\", "'": "\\'"})
+
+# AsyncMilvusClients shared by every VectorDB in the process, per event loop (gRPC aio channels
+# can't cross loops) and per (uri, token); the ORM side shares its connection through the alias.
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+# pymilvus keys async connections by uri+token alone, so each client gets its own alias to keep
+# one loop's channel (and its close()) away from the others
+_ASYNC_ALIAS_SEQ = itertools.count()
+
+# upper bound for HNSW ef at query time; larger ef buys little recall for a lot of latency
+MAX_EF = 512
+
+# schema limits checked client-side so one bad row is rejected before it joins a batch:
+# the VARCHAR primary key length and Milvus' default 64 KiB limit for a JSON field value
+MAX_ID_LENGTH = 128
+MAX_METADATA_BYTES = 65536
+
 
 class VectorDB:
     def __init__(
@@ -22,115 +51,394 @@ class VectorDB:
         *,
         connect_uri: str,
         milvus_token: str,
+        use_upsert: bool = True,
+        vector_dtype: str = "float16",
+        ef_search: Optional[int] = None,
+        normalize: bool = False,
+        alias: Optional[str] = None,
+        id_filter: bool = False,
     ) -> None:
         self.dim = int(dim)
+        # Collection.upsert needs Milvus >= 2.3; older servers fall back to delete + insert
+        self.use_upsert = use_upsert
         self.collection_name = collection_name
         self.metric = metric.lower()
         assert self.metric in ("cosine", "l2"), "metric must be 'cosine' or 'l2'"
-        self._milvus_metric = "COSINE" if self.metric == "cosine" else "L2"
+        # "cosine" is served as inner product: stored/query vectors must be unit-norm
+        # (ImageEmbedder output already is, or pass normalize=True), so Milvus can skip
+        # re-normalizing per search.
+        self._milvus_metric = "IP" if self.metric == "cosine" else "L2"
+        # opt-in: L2-normalize stored/query vectors here instead of rejecting non-unit ones
+        self.normalize = normalize
+        # storage precision of new collections; fp16 halves HNSW RAM and bytes read per distance
+        assert vector_dtype in ("float32", "float16"), "vector_dtype must be 'float32' or 'float16'"
+        self.vector_dtype = vector_dtype
+
+        # explicit connection alias: instances sharing (uri, collection) reuse one channel, others
+        # can't clobber the "default" alias
+        self.alias = alias or f"{self.collection_name}@{connect_uri}"
+        self._connect_uri = connect_uri
+        self._token = milvus_token
+        self._timeout = timeout
+        # search/query/delete/flush/load go through a shared native asyncio client (see _aclient)
 
         try:
-            connections.connect(uri=connect_uri, timeout=timeout, token=milvus_token)
-            logger.info(f"Connected to Milvus via URI")
+            connections.connect(alias=self.alias, uri=connect_uri, timeout=timeout, token=milvus_token)
+            logger.info("Connected to Milvus via URI")
 
-        except Exception as e:
-            logger.error(f"Failed to connect to Milvus: {e}")
+        except Exception:
+            logger.exception("Failed to connect to Milvus.")
             raise
 
         self.index_params = index_params or {
             "index_type": "HNSW",
             "metric_type": self._milvus_metric,
-            "params": {"M": 16, "efConstruction": 200}
+            "params": {"M": 16, "efConstruction": 128}
         }
+        # default ef when the caller passes none; otherwise adapted to top_k
+        self.ef_search = ef_search
+        self._search_params: Dict[int, Dict[str, Any]] = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        # opt-in bloom filter for exists(); only valid when this process is the collection's
+        # single writer, since it never sees ids written by other workers/replicas
+        self._id_filter: Optional[ScalableBloomFilter] = None
 
         try:
-            if not utility.has_collection(self.collection_name):
+            if not utility.has_collection(self.collection_name, using=self.alias):
                 if create_if_missing:
-                    logger.info(f"Collection '{self.collection_name}' not found. Creating...")
+                    logger.info("Collection '%s' not found. Creating...", self.collection_name)
                     self._create_collection_sync()
                 else:
                     raise RuntimeError(f"Collection '{self.collection_name}' not found and create_if_missing=False")
 
-            self._col = Collection(self.collection_name)
-            logger.info(f"Collection '{self.collection_name}' handle initialized.")
+            self._col = Collection(self.collection_name, using=self.alias)
+            logger.info("Collection '%s' handle initialized.", self.collection_name)
+            self._adopt_vector_dtype()
 
             self.create_index_sync(force=False)
 
-            logger.info(f"Collection '{self.collection_name}' ready.")
-        except Exception as e:
-            logger.error(f"Initialization error for collection '{self.collection_name}': {e}")
+            self._col.load()
+            self._loaded = True
+
+            if id_filter:
+                self._warm_id_filter_sync()
+
+            logger.info("Collection '%s' ready.", self.collection_name)
+        except Exception:
+            logger.exception("Initialization error for collection '%s'.", self.collection_name)
             raise
 
+    def _warm_id_filter_sync(self, batch_size: int = 10000):
+        """Fill the in-process id bloom filter from Milvus so exists() can answer misses locally.
+
+        Scans every id once. On failure the filter is disabled and exists() always asks Milvus.
+        """
+        self._id_filter = ScalableBloomFilter(
+            initial_capacity=1_000_000, error_rate=1e-4
+        )
+        try:
+            iterator = self._col.query_iterator(batch_size=batch_size, output_fields=["id"])
+            count = 0
+            try:
+                while True:
+                    rows = iterator.next()
+                    if not rows:
+                        break
+                    for r in rows:
+                        self._id_filter.add(r["id"])
+                    count += len(rows)
+            finally:
+                iterator.close()
+            logger.info("Id filter warmed with %s ids.", count)
+        except Exception:
+            self._id_filter = None
+            logger.exception("Failed to warm id filter, exists() will query Milvus.")
+
+    def _remember_ids(self, ids: Sequence[str]):
+        if self._id_filter is not None:
+            for i in ids:
+                self._id_filter.add(i)
+
+    def _aclient(self):
+        """The process-wide AsyncMilvusClient for this URI on the running loop, or None."""
+        if AsyncMilvusClient is None:
+            return None
+        clients = _ASYNC_CLIENTS.setdefault(asyncio.get_running_loop(), {})
+        key = (self._connect_uri, self._token)
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = AsyncMilvusClient(
+                uri=self._connect_uri, token=self._token, timeout=self._timeout,
+                alias=f"vectordb-async-{next(_ASYNC_ALIAS_SEQ)}",
+            )
+        return client
+
+    async def close(self):
+        """Close the shared async client for this URI on the running loop.
+
+        Other instances on the same URI transparently open a new one on their next call;
+        the ORM connection stays up under the alias.
+        """
+        clients = _ASYNC_CLIENTS.get(asyncio.get_running_loop(), {})
+        client = clients.pop((self._connect_uri, self._token), None)
+        if client is not None:
+            await client.close()
+
     def _create_collection_sync(self):
         try:
             id_field = FieldSchema(
                 name="id", dtype=DataType.VARCHAR,
-                is_primary=True, max_length=128
+                is_primary=True, max_length=MAX_ID_LENGTH
             )
             vec_field = FieldSchema(
-                name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.dim
+                name="embedding", dtype=self._milvus_vector_dtype, dim=self.dim
             )
+            # JSON rather than a VARCHAR blob: pymilvus (de)serializes it with orjson itself
             meta_field = FieldSchema(name="metadata", dtype=DataType.JSON)
             schema = CollectionSchema(
                 fields=[id_field, vec_field, meta_field],
                 description=f"Collection {self.collection_name} created by VectorDB"
             )
-            Collection(name=self.collection_name, schema=schema)
-            self._col = Collection(self.collection_name)
+            Collection(name=self.collection_name, schema=schema, using=self.alias)
+            self._col = Collection(self.collection_name, using=self.alias)
             self._col.flush()
-            logger.info(f"Collection '{self.collection_name}' created successfully.")
-        except Exception as e:
-            logger.error(f"Failed to create collection '{self.collection_name}': {e}")
+            logger.info("Collection '%s' created successfully.", self.collection_name)
+        except Exception:
+            logger.exception("Failed to create collection '%s'.", self.collection_name)
             raise
 
+    @property
+    def _milvus_vector_dtype(self):
+        return DataType.FLOAT16_VECTOR if self.vector_dtype == "float16" else DataType.FLOAT_VECTOR
+
+    def _adopt_vector_dtype(self):
+        """Use the storage type of an existing collection (e.g. FLOAT_VECTOR collections created earlier)."""
+        for field in self._col.schema.fields:
+            if field.name != "embedding":
+                continue
+            existing = "float16" if field.dtype == DataType.FLOAT16_VECTOR else "float32"
+            if existing != self.vector_dtype:
+                logger.warning("Collection '%s' stores %s vectors; using %s.", self.collection_name, existing, existing)
+                self.vector_dtype = existing
+
+    def _to_storage(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors.astype(np.float16) if self.vector_dtype == "float16" else vectors
+
     def create_index_sync(self, force: bool = False):
         try:
             field_name = "embedding"
             existing_indexes = []
             try:
-                existing_indexes = utility.list_indexes(self.collection_name, field_name=field_name)
+                existing_indexes = utility.list_indexes(self.collection_name, field_name=field_name, using=self.alias)
             except TypeError:
-                all_indexes = utility.list_indexes(self.collection_name)
+                all_indexes = utility.list_indexes(self.collection_name, using=self.alias)
                 existing_indexes = [n for n in all_indexes if field_name in n]
 
             if force and existing_indexes:
                 for idx_name in existing_indexes:
                     self._col.drop_index(index_name=idx_name)
-                    logger.info(f"Dropped old index '{idx_name}'.")
+                    logger.info("Dropped old index '%s'.", idx_name)
 
             if not existing_indexes:
                 params = self.index_params.copy()
                 params["metric_type"] = self._milvus_metric
                 self._col.create_index(field_name=field_name, index_params=params)
-                logger.info(f"Created new index on '{field_name}'.")
+                logger.info("Created new index on '%s'.", field_name)
             else:
-                logger.info(f"Index already exists on '{field_name}', skipped.")
-        except Exception as e:
-            logger.error(f"Create index error: {e}")
+                logger.info("Index already exists on '%s', skipped.", field_name)
+                self._adopt_index_metric(field_name)
+        except Exception:
+            logger.exception("Create index error.")
             raise
 
+    def _adopt_index_metric(self, field_name: str):
+        """Search with the metric the existing index was built with (e.g. COSINE on older collections)."""
+        for idx in self._col.indexes:
+            if idx.field_name != field_name:
+                continue
+            metric = (idx.params or {}).get("metric_type")
+            if metric and metric != self._milvus_metric:
+                logger.warning("Existing index on '%s' uses %s, not %s; using %s.", field_name, metric, self._milvus_metric, metric)
+                self._milvus_metric = metric
+                self._search_params = {}
+
+    def _unit_norm(self, vecs: np.ndarray) -> np.ndarray:
+        """For metric='cosine': normalize rows (normalize=True) or reject non-unit ones. Never in place."""
+        if self.metric != "cosine":
+            return vecs
+        norms = np.linalg.norm(vecs.reshape(-1, self.dim), axis=1)
+        if self.normalize:
+            return (vecs.reshape(-1, self.dim) / (norms[:, None] + 1e-12)).reshape(vecs.shape)
+        if not np.all(np.abs(norms - 1.0) < 1e-3):
+            raise ValueError("Vectors must be L2-normalized (unit norm) for metric='cosine', or pass normalize=True")
+        return vecs
+
+    @staticmethod
+    def validate_id(id: str) -> str:
+        """Reject ids the VARCHAR primary key would refuse (non-str or longer than MAX_ID_LENGTH)."""
+        if not isinstance(id, str) or not id:
+            raise ValueError("id must be a non-empty string")
+        if len(id.encode("utf-8")) > MAX_ID_LENGTH:
+            raise ValueError(f"id must be at most {MAX_ID_LENGTH} bytes")
+        return id
+
+    @staticmethod
+    def validate_metadata(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Reject metadata the JSON field would refuse: not a str-keyed dict, unserializable, or too large."""
+        if metadata is None:
+            return {}
+        if not isinstance(metadata, dict):
+            raise ValueError("metadata must be a dict")
+        try:
+            size = len(orjson.dumps(metadata, option=orjson.OPT_SERIALIZE_NUMPY))
+        except TypeError as e:
+            raise ValueError(f"metadata is not JSON serializable: {e}")
+        if size > MAX_METADATA_BYTES:
+            raise ValueError(f"metadata must serialize to at most {MAX_METADATA_BYTES} bytes")
+        return metadata
+
+    def validate_vector(self, vector: Union[Sequence[float], np.ndarray]) -> np.ndarray:
+        """Validate a single vector for upsert and return it as 1-D float32 (normalized if `normalize`)."""
+        vec = np.asarray(vector, dtype=np.float32)
+        if vec.ndim != 1 or vec.shape[0] != self.dim:
+            raise ValueError(f"Vector must be 1-D with dim={self.dim}")
+        return self._unit_norm(vec)
+
+    def _write_sync(self, ids: List[str], entities: List[Any]):
+        # stays on the ORM: AsyncMilvusClient only takes row dicts, while the ORM accepts the
+        # (N, dim) array as one column (packed with tobytes() for fp16 storage)
+        if self.use_upsert:
+            return self._col.upsert(entities)
+        self._col.delete(self._id_in_expr(ids))
+        return self._col.insert(entities)
+
     async def upsert_vector(self, id: str, vector: Union[Sequence[float], np.ndarray], metadata: Optional[Dict[str, Any]] = None):
         try:
-            vec = np.asarray(vector, dtype=np.float32)
-            if vec.ndim != 1 or vec.shape[0] != self.dim:
-                raise ValueError(f"Vector must be 1-D with dim={self.dim}")
+            vec = self.validate_vector(vector)
+
+            # (1, dim) ndarray column: fp16 storage is packed with tobytes(); pymilvus still converts
+            # float32 columns with tolist(), so FLOAT_VECTOR collections get no serialization win
+            entities = [[id], self._to_storage(vec.reshape(1, -1)), [metadata or {}]]
+
+            # primary-key upsert replaces an existing row in one RPC; no flush needed for
+            # searches to see it (growing segments are searchable). Call flush() for durability.
+            upsert_result = await asyncio.to_thread(self._write_sync, [id], entities)
+            self._remember_ids([id])
+            logger.debug("Upserted vector id='%s' successfully.", id)
+            return upsert_result
+        except Exception:
+            logger.exception("Failed to upsert id='%s'.", id)
+            raise
 
-            if await self.exists(id):
-                await self.delete(id)
+    async def upsert_vectors(
+        self,
+        ids: List[str],
+        vectors: np.ndarray,
+        metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+    ):
+        """Upsert N rows in a single RPC, passing the (N, dim) float32 array as one column.
+
+        Rejects other dtypes/shapes instead of silently copying. The saving is the one RPC;
+        only fp16 storage is serialized without a per-element tolist() in pymilvus.
+        """
+        try:
+            if not isinstance(vectors, np.ndarray) or vectors.dtype != np.float32:
+                raise ValueError("vectors must be a float32 np.ndarray")
+            if vectors.shape != (len(ids), self.dim):
+                raise ValueError(f"vectors must have shape ({len(ids)}, {self.dim}), got {vectors.shape}")
+            vectors = self._unit_norm(vectors)
+            metas = [m or {} for m in (metadatas or [None] * len(ids))]
+            if len(metas) != len(ids):
+                raise ValueError("metadatas must have the same length as ids")
+
+            entities = [list(ids), self._to_storage(vectors), metas]
+            upsert_result = await asyncio.to_thread(self._write_sync, list(ids), entities)
+            self._remember_ids(ids)
+            logger.debug("Upserted %s vectors successfully.", len(ids))
+            return upsert_result
+        except Exception:
+            logger.exception("Failed to upsert %s vectors.", len(ids))
+            raise
 
-            entities = [[id], [vec.tolist()], [metadata or {}]]
+    async def upsert_vectors_batch(
+        self,
+        ids: List[str],
+        vectors: Union[Sequence[Sequence[float]], np.ndarray],
+        metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+    ):
+        """Upsert N rows in a single RPC, then flush once."""
+        vecs = np.ascontiguousarray(vectors, dtype=np.float32)
+        upsert_result = await self.upsert_vectors(ids, vecs, metadatas)
+        await self.flush()
+        return upsert_result
+
+    def _prepare_queries(self, query_vector: Union[Sequence[float], np.ndarray]):
+        """-> ((nq, dim) contiguous float32 ndarray, single). _search() casts it to fp16 for
+        FLOAT16_VECTOR collections, which pymilvus packs with tobytes(); float32 queries are
+        still packed float by float (struct.pack) by pymilvus."""
+        q = np.asarray(query_vector, dtype=np.float32)
+        if q.ndim not in (1, 2) or q.shape[-1] != self.dim:
+            raise ValueError(f"query_vector must be 1-D or 2-D with dim={self.dim}")
+        single = q.ndim == 1
+        q = q.reshape(-1, self.dim)
+        if self.normalize and self.metric == "cosine":
+            q = self._unit_norm(q)
+        return np.ascontiguousarray(q), single
+
+    def _resolve_ef(self, limit: int, ef: Optional[int]) -> int:
+        """ef defaults to ef_search or max(64, 2 * limit), clamped to MAX_EF but never below limit."""
+        if ef is None:
+            ef = self.ef_search or max(64, 2 * limit)
+        return max(min(int(ef), MAX_EF), limit)
+
+    def _search_params_for(self, ef: int) -> Dict[str, Any]:
+        search_params = self._search_params.get(ef)
+        if search_params is None:
+            search_params = self._search_params[ef] = {"metric_type": self._milvus_metric, "params": {"ef": ef}}
+        return search_params
+
+    async def _search(
+        self,
+        queries,
+        top_k: int,
+        expr: Optional[str],
+        params: Optional[Dict[str, Any]],
+        out_fields: List[str],
+        ef: Optional[int] = None,
+    ):
+        if not self._loaded:
+            # only after an explicit release(); the hot path is just this flag check
+            await self.load()
+        search_params = params or self._search_params_for(self._resolve_ef(top_k, ef))
+        if self.vector_dtype == "float16":
+            queries = np.asarray(queries, dtype=np.float16)
+
+        client = self._aclient()
+        if client is not None:
+            # same SearchResult/Hits types as Collection.search, without a thread hop
+            return await client.search(
+                self.collection_name,
+                data=queries,
+                anns_field="embedding",
+                search_params=search_params,
+                limit=top_k,
+                filter=expr or "",
+                output_fields=out_fields,
+            )
 
-            def _sync_insert():
-                insert_result = self._col.insert(entities)
-                self._col.flush()
-                return insert_result
+        def _sync_search():
+            results = self._col.search(
+                data=queries,
+                anns_field="embedding",
+                param=search_params,
+                limit=top_k,
+                expr=expr,
+                output_fields=out_fields
+            )
+            return results
 
-            insert_result = await asyncio.to_thread(_sync_insert)
-            logger.info(f"Upserted vector id='{id}' successfully.")
-            return insert_result
-        except Exception as e:
-            logger.error(f"Failed to upsert id='{id}': {e}")
-            raise
+        return await asyncio.to_thread(_sync_search)
 
     async def retrieve_similar(
         self,
@@ -139,78 +447,189 @@ class VectorDB:
         expr: Optional[str] = None,
         params: Optional[Dict[str, Any]] = None,
         output_fields: Optional[List[str]] = None,
+        rerank: bool = False,
+        include_metadata: bool = True,
+        ef: Optional[int] = None,
     ):
+        """Top-k search. With `include_metadata=False` only ids and scores are fetched (no JSON field
+        transfer/decoding).
+
+        `rerank` is only for vector_dtype="float32" collections indexed with a quantized index
+        (e.g. IVF_SQ8/PQ, via index_params): it fetches 4x candidates and re-scores them exactly
+        against the stored float32 vectors before cutting to top_k. It is rejected for the default
+        float16 storage, where it would re-score the same fp16 vectors the index already used, and
+        buys nothing over plain HNSW, whose distances are already exact.
+        """
         try:
-            q = np.asarray(query_vector, dtype=np.float32)
-            if q.ndim == 1:
-                queries = [q.tolist()]
-                single = True
-            elif q.ndim == 2:
-                queries = [row.tolist() for row in q]
-                single = False
+            if rerank and self.vector_dtype != "float32":
+                raise ValueError("rerank needs a float32 collection (vector_dtype='float32')")
+            queries, single = self._prepare_queries(query_vector)
+            if output_fields is not None:
+                out_fields = list(output_fields)
             else:
-                raise ValueError("query_vector must be 1-D or 2-D")
-
-            search_params = params or {"metric_type": self._milvus_metric, "params": {"ef": 64}}
-            out_fields = output_fields or ["metadata", "id"]
-
-            def _sync_search():
-                self._col.load()
-                results = self._col.search(
-                    data=queries,
-                    anns_field="embedding",
-                    param=search_params,
-                    limit=top_k,
-                    expr=expr,
-                    output_fields=out_fields
-                )
-                return results
-
-            results = await asyncio.to_thread(_sync_search)
-
-            formatted = []
-            for res in results:
-                hits = []
-                for hit in res:
-                    hits.append({
-                        "image_id": hit.entity.get("id"),
-                        "similarity": float(hit.score),
-                        "metadata": hit.entity.get("metadata")
-                    })
-                formatted.append(hits)
-            logger.info(f"Retrieve similar done for top_k={top_k}.")
+                # the primary key comes back as hit.id without being requested
+                out_fields = ["metadata"] if include_metadata else []
+            limit = top_k
+            if rerank:
+                limit = min(top_k * 4, 16384)
+                if "embedding" not in out_fields:
+                    out_fields.append("embedding")
+            results = await self._search(queries, limit, expr, params, out_fields, ef=ef)
+
+            if rerank:
+                scored = [self._rerank(res, queries[i], top_k) for i, res in enumerate(results)]
+            else:
+                scored = [zip(res, res.distances) for res in results]
+
+            to_similarity = self._similarity_fn()
+
+            if include_metadata:
+                # the JSON field is already decoded by pymilvus (orjson on both write and read
+                # as of the pinned 2.6.x), so metadata dicts are passed through as-is
+                formatted = [
+                    [{"image_id": h.id, "similarity": to_similarity(score), "metadata": h.entity.get("metadata")} for h, score in res]
+                    for res in scored
+                ]
+            else:
+                formatted = [
+                    [{"image_id": h.id, "similarity": to_similarity(score)} for h, score in res]
+                    for res in scored
+                ]
+            logger.debug("Retrieve similar done for top_k=%s.", top_k)
             return formatted[0] if single else formatted
-        except Exception as e:
-            logger.error(f"Search error: {e}")
+        except Exception:
+            logger.exception("Search error.")
+            raise
+
+    def _similarity_fn(self):
+        """Raw Milvus distance -> similarity, higher is more similar, for every search method:
+        L2 distances are negated; IP on unit vectors can overshoot 1.0 by float error
+        (e.g. an exact duplicate), so it is clamped."""
+        if self.metric == "l2":
+            return lambda score: -float(score)
+        return lambda score: min(float(score), 1.0)
+
+    def _rerank(self, hits, query: np.ndarray, top_k: int):
+        """Exact float32 re-scoring of candidate hits, same score convention as the Milvus metric."""
+        if len(hits) == 0:
+            return []
+        hits = list(hits)
+        vecs = np.asarray([h.entity.get("embedding") for h in hits], dtype=np.float32)
+        if self._milvus_metric == "L2":
+            scores = np.sum((vecs - query) ** 2, axis=1)
+            order = np.argsort(scores)[:top_k]
+        else:
+            if self._milvus_metric == "COSINE":
+                vecs = vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+                query = query / max(float(np.linalg.norm(query)), 1e-12)
+            scores = vecs @ query
+            order = np.argsort(-scores)[:top_k]
+        return [(hits[k], float(scores[k])) for k in order]
+
+    async def retrieve_similar_numpy(
+        self,
+        query_vector: Union[Sequence[float], np.ndarray],
+        top_k: int = 5,
+        expr: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None,
+        ef: Optional[int] = None,
+    ):
+        """Ids and similarities only, as arrays: (ids, scores) of shape (top_k,) for a 1-D query,
+        (nq, top_k) for a 2-D one. Scores follow retrieve_similar (higher is more similar).
+        Rows with fewer hits are padded with "" / NaN. No metadata is fetched.
+        """
+        try:
+            queries, single = self._prepare_queries(query_vector)
+            results = await self._search(queries, top_k, expr, params, [], ef=ef)
+
+            ids = np.full((len(results), top_k), "", dtype=object)
+            scores = np.full((len(results), top_k), np.nan, dtype=np.float32)
+            for i, res in enumerate(results):
+                n = len(res)
+                ids[i, :n] = res.ids
+                scores[i, :n] = res.distances
+            # vectorized _similarity_fn (NaN padding stays NaN)
+            if self.metric == "l2":
+                np.negative(scores, out=scores)
+            else:
+                np.minimum(scores, 1.0, out=scores)
+            logger.debug("Retrieve similar (numpy) done for top_k=%s.", top_k)
+            return (ids[0], scores[0]) if single else (ids, scores)
+        except Exception:
+            logger.exception("Search error.")
             raise
 
     # helpers
+    @staticmethod
+    def _id_eq_expr(id: str) -> str:
+        return "id == '" + id.translate(_ID_ESCAPE) + "'"
+
+    @staticmethod
+    def _id_in_expr(ids: Sequence[str]) -> str:
+        """Build a single `id in [...]` filter so N ids cost one RPC."""
+        return "id in [" + ",".join("'" + i.translate(_ID_ESCAPE) + "'" for i in ids) + "]"
+
+    async def _query(self, expr: str, out_fields: List[str]) -> List[Dict[str, Any]]:
+        client = self._aclient()
+        if client is not None:
+            return await client.query(self.collection_name, filter=expr, output_fields=out_fields)
+        return await asyncio.to_thread(self._col.query, expr=expr, output_fields=out_fields)
+
+    async def _delete(self, expr: str):
+        client = self._aclient()
+        if client is not None:
+            return await client.delete(self.collection_name, filter=expr)
+        return await asyncio.to_thread(self._col.delete, expr)
+
     async def exists(self, id: str) -> bool:
+        """Check whether a row with this primary key exists.
+
+        With `id_filter=True` (single-writer deployments only), ids never written are answered
+        from the local bloom filter; a filter hit falls through to a Milvus query RPC, as does
+        every call by default. Writes don't need this,
+        upsert_vector() already replaces existing rows by primary key.
+        """
+        if self._id_filter is not None and id not in self._id_filter:
+            return False
         try:
-            safe_id = id.replace("'", "\\'")
-            expr = f"id == '{safe_id}'"
-
-            res = await asyncio.to_thread(self._col.query, expr=expr, output_fields=["id"])
+            res = await self._query(self._id_eq_expr(id), ["id"])
             return len(res) > 0
-        except Exception as e:
-            logger.error(f"Exists check failed for id='{id}': {e}")
+        except Exception:
+            logger.exception("Exists check failed for id='%s'.", id)
             return False
 
     async def delete(self, id: str):
         try:
-            safe_id = id.replace("'", "\\'")
-            expr = f"id == '{safe_id}'"
-
-            def _sync_delete():
-                res = self._col.delete(expr)
-                self._col.flush()
-                return res
+            res = await self._delete(self._id_eq_expr(id))
+            logger.debug("Deleted id='%s'.", id)
+            return res
+        except Exception:
+            logger.exception("Delete failed for id='%s'.", id)
+            raise
 
-            res = await asyncio.to_thread(_sync_delete)
-            logger.info(f"Deleted id='{id}'.")
+    async def exists_many(self, ids: Sequence[str]) -> Set[str]:
+        """Return the subset of `ids` present in the collection (at most one query RPC)."""
+        if self._id_filter is not None:
+            ids = [i for i in ids if i in self._id_filter]
+        if not ids:
+            return set()
+        try:
+            res = await self._query(self._id_in_expr(ids), ["id"])
+            return {r["id"] for r in res}
+        except Exception:
+            logger.exception("Exists check failed for %s ids.", len(ids))
+            return set()
+
+    async def delete_many(self, ids: Sequence[str]):
+        """Delete all rows whose id is in `ids` with one delete RPC."""
+        if not ids:
+            return None
+        try:
+            res = await self._delete(self._id_in_expr(ids))
+            logger.debug("Deleted %s ids.", len(ids))
             return res
-        except Exception as e:
-            logger.error(f"Delete failed for id='{id}': {e}")
+        except Exception:
+            logger.exception("Delete failed for %s ids.", len(ids))
             raise
 
     async def create_index(self, force: bool = False):
@@ -219,9 +638,9 @@ class VectorDB:
 
             def _sync_list_indexes():
                 try:
-                    return utility.list_indexes(self.collection_name, field_name=field_name)
+                    return utility.list_indexes(self.collection_name, field_name=field_name, using=self.alias)
                 except TypeError:
-                    all_indexes = utility.list_indexes(self.collection_name)
+                    all_indexes = utility.list_indexes(self.collection_name, using=self.alias)
                     return [n for n in all_indexes if field_name in n]
 
             existing_indexes = await asyncio.to_thread(_sync_list_indexes)
@@ -230,41 +649,62 @@ class VectorDB:
                 # drop indexes in thread(s)
                 for idx_name in existing_indexes:
                     await asyncio.to_thread(self._col.drop_index, index_name=idx_name)
-                    logger.info(f"Dropped old index '{idx_name}'.")
+                    logger.info("Dropped old index '%s'.", idx_name)
 
             if not existing_indexes:
                 params = self.index_params.copy()
                 params["metric_type"] = self._milvus_metric
                 await asyncio.to_thread(self._col.create_index, field_name=field_name, index_params=params)
-                logger.info(f"Created new index on '{field_name}'.")
+                logger.info("Created new index on '%s'.", field_name)
             else:
-                logger.info(f"Index already exists on '{field_name}', skipped.")
-        except Exception as e:
-            logger.error(f"Create index error: {e}")
+                logger.info("Index already exists on '%s', skipped.", field_name)
+                await asyncio.to_thread(self._adopt_index_metric, field_name)
+        except Exception:
+            logger.exception("Create index error.")
             raise
 
     async def load(self):
-        try:
-            await asyncio.to_thread(self._col.load)
-            logger.info("Collection loaded into memory.")
-        except Exception as e:
-            logger.error(f"Load error: {e}")
-            raise
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            try:
+                client = self._aclient()
+                if client is not None:
+                    await client.load_collection(self.collection_name)
+                else:
+                    await asyncio.to_thread(self._col.load)
+                self._loaded = True
+                logger.info("Collection loaded into memory.")
+            except Exception:
+                logger.exception("Load error.")
+                raise
 
     async def release(self):
-        try:
-            await asyncio.to_thread(self._col.release)
-            logger.info("Collection released from memory.")
-        except Exception as e:
-            logger.error(f"Release error: {e}")
-            raise
+        async with self._load_lock:
+            try:
+                client = self._aclient()
+                if client is not None:
+                    await client.release_collection(self.collection_name)
+                else:
+                    await asyncio.to_thread(self._col.release)
+                self._loaded = False
+                logger.info("Collection released from memory.")
+            except Exception:
+                logger.exception("Release error.")
+                raise
 
     async def flush(self):
         try:
-            await asyncio.to_thread(self._col.flush)
-            logger.info("Flushed collection to disk.")
-        except Exception as e:
-            logger.error(f"Flush error: {e}")
+            client = self._aclient()
+            if client is not None:
+                await client.flush(self.collection_name)
+            else:
+                await asyncio.to_thread(self._col.flush)
+            logger.debug("Flushed collection to disk.")
+        except Exception:
+            logger.exception("Flush error.")
             raise
 
 if __name__ == "__main__":
@@ -285,8 +725,13 @@ if __name__ == "__main__":
     )
 
 
-    cat = np.random.rand(1024)
-    asyncio.run(vdb.upsert_vector("img_1", cat, metadata={"id": "cat_1234"}))
-    results = asyncio.run(vdb.retrieve_similar(cat, top_k=3))
-    print(results)
-    asyncio.run(vdb.delete("img_1"))
\ No newline at end of file
+    async def main():
+        cat = np.random.rand(1024)
+        cat = cat / np.linalg.norm(cat)
+        await vdb.upsert_vector("img_1", cat, metadata={"id": "cat_1234"})
+        results = await vdb.retrieve_similar(cat, top_k=3)
+        print(results)
+        await vdb.delete("img_1")
+        await vdb.close()
+
+    asyncio.run(main())
\ No newline at end of file
@@ -1,17 +1,16 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 
-def get_logger(name: str = "app", log_file: str = "logger/app.log") -> logging.Logger:
-    # Ensure log directory exists
-    os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+# one background listener per log file; callers only enqueue records (no disk I/O on the event loop)
+_listeners = {}
 
-    # Create logger
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
 
-    
-    if logger.hasHandlers():
-        logger.handlers.clear()
+def _start_listener(log_file: str) -> queue.Queue:
+    if log_file in _listeners:
+        return _listeners[log_file].queue
 
     with open(log_file, "w", encoding="utf-8") as f: 
         pass 
@@ -28,6 +27,25 @@ def get_logger(name: str = "app", log_file: str = "logger/app.log") -> logging.L
 
     file_handler.setFormatter(formatter)
 
-    logger.addHandler(file_handler)
+    log_queue = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    _listeners[log_file] = listener
+    return log_queue
+
+
+def get_logger(name: str = "app", log_file: str = "logger/app.log") -> logging.Logger:
+    # Ensure log directory exists
+    os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+
+    # Create logger
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+
+    if logger.hasHandlers():
+        logger.handlers.clear()
+
+    logger.addHandler(logging.handlers.QueueHandler(_start_listener(log_file)))
 
     return logger
@@ -10,7 +10,7 @@ class UpsertResponse(BaseModel):
 
 class RetrievedRecord(BaseModel):
     image_id: str
-    metadata: Dict[str, Any]
+    metadata: Optional[Dict[str, Any]] = None
     similarity: float = Field(..., ge=0.0, le=1.0)
 
 class RetrieveResponse(BaseModel):
@@ -1,5 +1,6 @@
 import time
 import os
+import asyncio
 
 import uvicorn
 from contextlib import asynccontextmanager
@@ -10,7 +11,7 @@ from schemas import (UpsertResponse, RetrieveResponse,DeleteResponse,
                      ComparisonResponse, ContextRequest, ProductConstraint)
 
 from utils.review_filter import filter_representative_reviews
-from engines import VectorDB, ImageEmbedder, LLMEngine
+from engines import VectorDB, ImageEmbedder, LLMEngine, UpsertCoalescer, SearchCoalescer
 
 # Init app instances
 from dotenv import load_dotenv
@@ -29,16 +30,30 @@ device = os.environ.get("DEVICE")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global vdb, embedder, llm
+    global vdb, embedder, llm, upsert_coalescer, search_coalescer
+    # HNSW knobs, tunable per deployment without code changes
+    hnsw_m = int(os.environ.get("HNSW_M", 16))
+    hnsw_efc = int(os.environ.get("HNSW_EFC", 128))
+    hnsw_ef_search = os.environ.get("HNSW_EF_SEARCH")
     vdb = VectorDB(
         dim=vector_dim,
         connect_uri=milvus_uri,
         collection_name=collection_name,
-        milvus_token=milvus_token
+        milvus_token=milvus_token,
+        index_params={"index_type": "HNSW", "params": {"M": hnsw_m, "efConstruction": hnsw_efc}},
+        ef_search=int(hnsw_ef_search) if hnsw_ef_search else None,
     )
+    upsert_coalescer = UpsertCoalescer(vdb)
+    upsert_coalescer.start()
+    search_coalescer = SearchCoalescer(vdb)
+    search_coalescer.start()
     embedder = ImageEmbedder(model_name_or_path=model_path, device=device)
+    await asyncio.to_thread(embedder.warmup)
     llm = LLMEngine(openai_api_key=openai_api_key)
     yield
+    await search_coalescer.stop()
+    await upsert_coalescer.stop()
+    await vdb.close()
 
 app = FastAPI(
     title="AI Service API",
@@ -61,10 +76,8 @@ async def upsert_image(
     item_id: str = Form(...),
 ):
     try:
-        raw = await image_bytes.read()  # bytes
-
-        # Embed the image
-        embedding = await embedder.embed(raw)
+        # Embed the image straight from the spooled upload (no full in-memory copy)
+        embedding = await embedder.embed(image_bytes.file)
 
         # Prepare metadata
         metadata = {
@@ -73,7 +86,7 @@ async def upsert_image(
         }
 
         # Upsert into the vector vdb
-        status = await vdb.upsert_vector(id=image_id, vector=embedding, metadata=metadata)
+        status = await upsert_coalescer.upsert(id=image_id, vector=embedding, metadata=metadata)
 
         if status:
             return UpsertResponse(image_id=image_id, status="success", metadata=metadata)
@@ -92,14 +105,11 @@ async def retrieve_similar_images(
     image_bytes: UploadFile = File(...),
 ):
     try:
-
-        raw = await image_bytes.read()
-
-        # Embed the query image
-        query_embedding = await embedder.embed(raw)
+        # Embed the query image straight from the spooled upload
+        query_embedding = await embedder.embed(image_bytes.file)
 
         # Retrieve similar items from the vdb
-        results = await vdb.retrieve_similar(query_vector=query_embedding, top_k=top_k)
+        results = await search_coalescer.search(query_embedding, top_k=top_k)
 
         return RetrieveResponse(results=results)
 
@@ -133,12 +143,15 @@ async def compare_product(
 
     try:
         for product in request.products:
-            filtered_reviews = filter_representative_reviews(product.reviews)
-            if not filtered_reviews:
-                filtered_reviews = None
+            # no reviews -> None, analyze_product returns its canned "no reviews" analysis
+            product.reviews = filter_representative_reviews(product.reviews) or None
+
+        # independent LLM calls: wall time is the slowest product, not the sum
+        analyses = await llm.analyze_products(request.products)
 
-            product.reviews = filtered_reviews
-            analysis = await llm.analyze_product(product)
+        for product, analysis in zip(request.products, analyses):
+            if isinstance(analysis, BaseException):
+                raise analysis
             product_summaries[product.name] = [
                 AspectAnalysis(**a) for a in analysis["aspects"]
             ]
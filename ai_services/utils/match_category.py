@@ -1,37 +1,56 @@
-from typing import List
+from typing import List, Sequence
+import ahocorasick
+import numpy as np
 from schemas import Product, AccessorySuggestion
 
+
+def _keyword_hits(texts: Sequence[str], keywords: List[str]) -> np.ndarray:
+    """Boolean mask: does each text contain any keyword as a substring (one Aho-Corasick pass per text)."""
+    if "" in keywords:
+        return np.ones(len(texts), dtype=bool)
+    automaton = ahocorasick.Automaton()
+    for kw in keywords:
+        automaton.add_word(kw, kw)
+    automaton.make_automaton()
+    return np.fromiter((next(automaton.iter(t), None) is not None for t in texts), dtype=bool, count=len(texts))
+
+
 def match_products(products: List[Product], constraints: dict) -> List[AccessorySuggestion]:
-    matched = []
+    if not products:
+        return []
 
     budget = constraints.get("budget")
     brands = [b.lower() for b in constraints.get("brands", [])]
     category = (constraints.get("category") or "").lower()
     features = [f.lower() for f in constraints.get("features", [])]
 
-    for p in products:
-        score = 0
+    # Safe handling for None values, lowercased once per product
+    score = np.zeros(len(products), dtype=np.int64)
 
-        # Safe handling for None values
-        p_category = (p.category or "").lower()
-        p_brand = (p.brand or "").lower()
-        p_description = (p.description or "").lower()
+    if category:
+        cats = np.array([(p.category or "").lower() for p in products], dtype=str)
+        score += 2 * (np.char.find(cats, category) >= 0)
 
-        if category and category in p_category:
-            score += 2
+    if brands:
+        score += _keyword_hits([(p.brand or "").lower() for p in products], brands)
 
-        if brands and any(b in p_brand for b in brands):
-            score += 1
+    if features:
+        score += _keyword_hits([(p.description or "").lower() for p in products], features)
 
-        if features and any(f in p_description for f in features):
-            score += 1
+    # top k without a full sort; ties keep input order like a stable sort would
+    k = min(3, len(products))
+    kth = np.partition(score, len(score) - k)[len(score) - k]
+    above = np.flatnonzero(score > kth)
+    tied = np.flatnonzero(score == kth)[: k - len(above)]
+    top = np.concatenate([above, tied])
+    top = top[np.lexsort((top, -score[top]))]
+
+    matched = []
+    for i in top:
+        p = products[i]
         if budget is not None and p.price is not None:
             expression = "Less" if p.price <= budget else "More"
         else:
             expression = None
-
-        matched.append((score, AccessorySuggestion(id=p.id, name=p.name, expression=expression)))
-
-    # sort top k
-    matched.sort(key=lambda x: x[0], reverse=True)
-    return [m[1] for m in matched[:3]]
+        matched.append(AccessorySuggestion(id=p.id, name=p.name, expression=expression))
+    return matched
@@ -4,32 +4,51 @@ from datetime import datetime
 from schemas import Review, ReviewFilter
 
 def filter_representative_reviews(reviews: List[Review]) -> List[Review]:
-    """Filter representative reviews based on criteria."""
-    filter_params = ReviewFilter() 
-    filtered = [
-        r for r in reviews
-        if (filter_params.min_rating <= r.rating <= filter_params.max_rating)
-        and (not filter_params.verified_only or (r.verified_purchase or False))
-        and (not filter_params.date_from or r.date >= filter_params.date_from)
-    ]
-
-    if not filtered:
+    """Filter representative reviews based on criteria.
+
+    Single pass: each review is filtered inline and fed into an Algorithm-R reservoir for its
+    rating bucket (positive / neutral / negative), then each bucket is cut to its share.
+    """
+    filter_params = ReviewFilter()
+    cap = filter_params.max_reviews_per_product
+
+    # positive (>= 4), neutral (== 3), negative (<= 2)
+    reservoirs = ([], [], [])
+    seen = [0, 0, 0]
+    total = 0
+    for r in reviews:
+        if not (filter_params.min_rating <= r.rating <= filter_params.max_rating):
+            continue
+        if filter_params.verified_only and not r.verified_purchase:
+            continue
+        if filter_params.date_from and r.date < filter_params.date_from:
+            continue
+        total += 1
+
+        if r.rating >= 4:
+            bucket = 0
+        elif r.rating == 3:
+            bucket = 1
+        elif r.rating <= 2:
+            bucket = 2
+        else:
+            continue
+
+        seen[bucket] += 1
+        reservoir = reservoirs[bucket]
+        if len(reservoir) < cap:
+            reservoir.append(r)
+        else:
+            j = random.randrange(seen[bucket])
+            if j < cap:
+                reservoir[j] = r
+
+    if not total:
         return []
 
-
-    positive = [r for r in filtered if r.rating >= 4]
-    neutral = [r for r in filtered if r.rating == 3]
-    negative = [r for r in filtered if r.rating <= 2]
-
-    total = len(filtered)
-    max_reviews = min(filter_params.max_reviews_per_product, total)
-
-    def sample(reviews, count):
-        return random.sample(reviews, min(count, len(reviews))) if reviews else []
-
-    pos_n = int(max_reviews * (len(positive) / total))
-    neu_n = int(max_reviews * (len(neutral) / total))
-    neg_n = int(max_reviews * (len(negative) / total))
-
-    selected = sample(positive, pos_n) + sample(neutral, neu_n) + sample(negative, neg_n)
-    return selected[:max_reviews]
+    max_reviews = min(cap, total)
+    selected = []
+    for reservoir, count in zip(reservoirs, seen):
+        n = min(int(max_reviews * (count / total)), len(reservoir))
+        selected.extend(random.sample(reservoir, n))
+    return selected